@@ -4,25 +4,49 @@ LangGraph Multi-Agent Research System with Gradio Interface
 Run this script directly: python research_app.py
 """
 
+import asyncio
+import hashlib
+import json
 import os
+import re
+import sqlite3
+import threading
 import time
-import uuid
-from typing import List, Union, Callable
+from typing import List, Literal, Union, Callable
 from datetime import datetime, timezone
-from urllib.parse import quote
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
 
 # Environment and configuration
+import aiosqlite
+import httpx
+import requests
+from cachetools import TTLCache
+from diskcache import Cache as DiskCache
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 
 # LangGraph and LangChain imports
 from langgraph.graph import MessagesState, START, END, StateGraph
 from langgraph.prebuilt import ToolNode, create_react_agent
-from langgraph_supervisor import create_supervisor
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langchain_core.messages import (
+    AIMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
 from langchain_core.tools import Tool
-from langchain.tools import tool
+from langchain.globals import set_llm_cache
 from langchain_anthropic import ChatAnthropic
+from langchain_community.cache import SQLiteCache
 from langchain_community.tools.tavily_search.tool import TavilySearchResults
 from langchain_community.utilities import WikipediaAPIWrapper
 
@@ -44,95 +68,463 @@ if not ANTHROPIC_API_KEY:
 
 # Model configuration
 MODEL = 'claude-sonnet-4-20250514'  # Updated to a stable model version
+HAIKU_MODEL = 'claude-3-5-haiku-20241022'  # Cheap/fast tier for simple agents
+
+# Hard ceiling on graph steps per run. The react sub-agents inherit this via
+# the run config, so a degenerate search loop fails fast with a clear
+# GraphRecursionError instead of burning tokens until the default (25 per
+# subgraph) finally trips.
+RECURSION_LIMIT = 20
+
+# Cache LLM responses on disk, keyed on the exact (model, messages, tools)
+# request. The planning, citation, and reflection agents see identical
+# requests when a query repeats, so hits skip the API call entirely — but
+# only because the injected date stamp is day-granular (see make_prompt);
+# any finer-grained dynamic content in the prompts would silently defeat
+# this exact-match cache.
+set_llm_cache(SQLiteCache(database_path=".llm_cache.db"))
 
 # ============================================================================
 # INITIALIZE CLAUDE MODEL
 # ============================================================================
 
-claude = ChatAnthropic(
+# Extended thinking pays off where the model reasons about tool use (search);
+# for the template- and rubric-driven agents it just burns 1024 thinking
+# tokens of cost and latency per turn, so they run without it.
+claude_thinking = ChatAnthropic(
     model_name=MODEL,
-    temperature=1,
+    temperature=1,  # Thinking mode requires temperature 1
     max_tokens=2000,
-    
-    # Enable thinking with budget_tokens as required by API  
+
+    # Enable thinking with budget_tokens as required by API
     thinking={"type": "enabled", "budget_tokens": 1024},
-    
+
     # Enable interleaved thinking for better tool use and reasoning
     extra_headers={
         "anthropic-beta": "interleaved-thinking-2025-05-14"
     },
-    
-    # Enable keep-alive as recommended by Anthropic
-    timeout=300.0,  # 5 minute timeout
+
+    # Enable keep-alive as recommended by Anthropic. The 5 minute ceiling
+    # stays — thinking turns legitimately run long — but transient API
+    # errors get exactly two SDK-level retries instead of the default's
+    # longer backoff ladder.
+    timeout=300.0,
+    max_retries=2,
+
+    # Attach usage metadata to streamed chunks so cache-hit logging works
+    # on the streaming path too
+    stream_usage=True,
+)
+
+claude_fast = ChatAnthropic(
+    model_name=MODEL,
+    temperature=0,
+    max_tokens=1500,
+    thinking={"type": "disabled"},
+    timeout=300.0,
+    max_retries=2,
+    stream_usage=True,
+)
+
+# Planning, citation, and reflection are structured text/rubric tasks well
+# within Haiku's capability — far cheaper and faster per token than Sonnet
+claude_haiku = ChatAnthropic(
+    model_name=HAIKU_MODEL,
+    temperature=0,
+    max_tokens=1000,
+    timeout=300.0,
+    max_retries=2,
+    stream_usage=True,
 )
 
 # ============================================================================
 # TOOL DEFINITIONS
 # ============================================================================
 
+def _install_pooled_session():
+    """Route Tavily and Wikipedia traffic through one pooled requests.Session.
+
+    Both libraries issue module-level requests.get/post calls, so under
+    concurrent load every search pays a fresh TCP+TLS handshake. A shared
+    Session with sized-up adapters keeps connections alive across calls.
+    (The Claude clients need no equivalent: langchain-anthropic already
+    shares one pooled httpx client across ChatAnthropic instances with the
+    same base URL and timeout.)
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    # Both modules resolve HTTP verbs off their `requests` global, so a
+    # Session (which exposes the same get/post API) can stand in for it
+    try:
+        from langchain_community.utilities import tavily_search
+        tavily_search.requests = session
+    except ImportError:
+        pass
+
+    try:
+        import wikipedia
+        wikipedia.wikipedia.requests = session
+    except ImportError:
+        pass
+
+    return session
+
+_POOLED_SESSION = _install_pooled_session()
+
+# Shared async client for tools that speak REST directly: one keep-alive
+# HTTP/2 pool for the whole process instead of a fresh connection (or a
+# worker thread) per call.
+_ASYNC_HTTP = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=20),
+    timeout=30.0,
+)
+
+# With parallel tool calls and batch queries in play, unbounded fan-out can
+# trip external rate limits (Tavily's free tier allows ~100 req/min) and turn
+# the parallelism win into a serial retry storm. Bound in-flight calls per
+# backend.
+_TAVILY_SEM = asyncio.Semaphore(5)
+_WIKI_SEM = asyncio.Semaphore(3)
+
+# Disk-backed result cache shared by both search tools. Hits survive process
+# restarts (demo sessions replay the same example queries), cost nothing
+# against API quotas, and return in well under a millisecond. SQLite-backed,
+# thread- and process-safe, capped at 1 GiB with per-entry TTLs set at the
+# call site.
+_TOOL_CACHE = DiskCache("./.tool_cache", size_limit=2**30)
+
+def _tool_cache_key(tool_name, query):
+    """Hash the tool name plus the normalized query into a fixed-width key."""
+    payload = f"{tool_name}|{' '.join(query.lower().split())}"
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+class _CircuitBreaker:
+    """Minimal circuit breaker for the external search backends.
+
+    After fail_max consecutive failures the breaker opens and calls are
+    short-circuited for reset_timeout seconds; the first call after that
+    window goes through as a probe. A hung or down backend then costs one
+    timeout instead of a timeout per agent turn, and the pipeline degrades
+    to synthesizing from whatever evidence it already has. (pybreaker does
+    the same job, but it's a dependency for twenty lines of logic.)
+    """
+
+    def __init__(self, fail_max=3, reset_timeout=60):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+
+    def is_open(self):
+        if self._failures < self.fail_max:
+            return False
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            # Half-open: let one probe through; success resets, failure re-opens
+            self._failures = self.fail_max - 1
+            return False
+        return True
+
+    def record_success(self):
+        self._failures = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self._failures >= self.fail_max:
+            self._opened_at = time.monotonic()
+
+_TAVILY_BREAKER = _CircuitBreaker()
+_WIKI_BREAKER = _CircuitBreaker()
+
+# Per-call ceiling for a single search request. Tenacity retries around the
+# individual HTTP calls stay inside this window's spirit: a stuck socket no
+# longer pins a Gradio worker for the full HTTP timeout.
+_TOOL_TIMEOUT = 15.0
+
+_TOOL_UNAVAILABLE = (
+    "Search temporarily unavailable — proceed with the evidence already gathered."
+)
+
+def _canonical_url(url):
+    """Normalize a result URL so trivially different links compare equal.
+
+    Lowercases scheme and host, drops fragments and tracking parameters
+    (utm_*, fbclid, gclid), and strips the trailing slash — the usual ways
+    the same article shows up twice across overlapping searches.
+    """
+    scheme, netloc, path, query, _ = urlsplit(url)
+    params = [
+        (k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+        if not k.startswith("utm_") and k not in ("fbclid", "gclid")
+    ]
+    return urlunsplit((
+        scheme.lower(), netloc.lower(), path.rstrip("/"),
+        urlencode(params), "",
+    ))
+
+def _dedupe_results(results, seen):
+    """Drop results whose URL or snippet has already been seen this call.
+
+    Overlapping sub-queries in a batched tool call routinely return the same
+    pages; every duplicate that survives is tokens the citation and synthesis
+    agents pay to re-read. `seen` is threaded across the batch so later
+    sub-queries dedupe against earlier ones.
+    """
+    if not isinstance(results, list):
+        return results
+    kept = []
+    for item in results:
+        if not isinstance(item, dict):
+            kept.append(item)
+            continue
+        keys = []
+        if item.get("url"):
+            keys.append(_canonical_url(item["url"]))
+        snippet = " ".join(str(item.get("content", "")).lower().split())
+        if snippet:
+            keys.append(hashlib.blake2b(snippet.encode(), digest_size=8).hexdigest())
+        if any(k in seen for k in keys):
+            continue
+        seen.update(keys)
+        kept.append(item)
+    return kept
+
+def _split_queries(query):
+    """Split a tool input that may carry several queries, one per line.
+
+    Letting the model pass all its sub-queries in a single tool call turns N
+    sequential think-act-observe ReAct cycles into one LLM decision plus
+    parallel fetches.
+    """
+    queries = [q.strip() for q in query.splitlines() if q.strip()]
+    return queries or [query]
+
 def create_tavily_search_tool(api_key):
     """Create the Tavily search tool."""
     if not api_key:
         print("⚠️ Tavily API key not found, search functionality will be limited")
         return None
-    
+
+    # One client for all calls — reinstantiating per search would allocate a
+    # fresh HTTP session (and TLS handshake) every time
+    client = TavilySearchResults(
+        api_key=api_key,
+        max_results=3,
+        include_answer=True,
+        search_depth="basic"
+    )
+
+    # Web results go stale quickly (news, current events), so keep hits for
+    # 15 minutes only
+    cache_ttl = 900
+
+    @retry(
+        retry=retry_if_exception_type(requests.RequestException),
+        wait=wait_exponential_jitter(initial=1, max=30),
+        stop=stop_after_attempt(4),
+        reraise=True,
+    )
+    def invoke_with_retry(query, *args, **kwargs):
+        return client.invoke(query, *args, **kwargs)
+
     def tavily_search(query, *args, **kwargs):
+        cache_key = _tool_cache_key("tavily", query)
+        cached = _TOOL_CACHE.get(cache_key)
+        if cached is not None:
+            print(f"♻️ Tavily cache hit for: {query[:50]}...")
+            return cached
+
+        if _TAVILY_BREAKER.is_open():
+            print("⛔ Tavily circuit open — skipping search")
+            return _TOOL_UNAVAILABLE
+
         try:
             print(f"🔍 Searching for: {query[:50]}...")
-            results = TavilySearchResults(
-                api_key=api_key,
-                max_results=3,
-                include_answer=True,
-                search_depth="basic"
-            )(query, *args, **kwargs)
+            results = invoke_with_retry(query, *args, **kwargs)
+            _TAVILY_BREAKER.record_success()
+            _TOOL_CACHE.set(cache_key, results, expire=cache_ttl)
             return results
         except Exception as e:
+            _TAVILY_BREAKER.record_failure()
             print(f"Error in Tavily search: {e}")
             return f"Search error: {str(e)}"
-    
+
+    def tavily_search_multi(query, *args, **kwargs):
+        queries = _split_queries(query)
+        if len(queries) == 1:
+            return tavily_search(queries[0], *args, **kwargs)
+        seen = set()
+        return "\n\n".join(
+            f'Results for "{q}":\n{_dedupe_results(tavily_search(q), seen)}'
+            for q in queries
+        )
+
+    @retry(
+        retry=retry_if_exception_type(httpx.HTTPError),
+        wait=wait_exponential_jitter(initial=1, max=30),
+        stop=stop_after_attempt(4),
+        reraise=True,
+    )
+    async def fetch_async(query):
+        # Async-native REST call on the shared HTTP/2 pool — no worker
+        # thread, no per-call connection setup
+        response = await _ASYNC_HTTP.post(
+            "https://api.tavily.com/search",
+            json={
+                "api_key": api_key,
+                "query": query,
+                "max_results": 3,
+                "include_answer": True,
+                "search_depth": "basic",
+            },
+        )
+        response.raise_for_status()
+        return response.json().get("results", [])
+
+    async def search_one_async(query):
+        cache_key = _tool_cache_key("tavily", query)
+        cached = _TOOL_CACHE.get(cache_key)
+        if cached is not None:
+            print(f"♻️ Tavily cache hit for: {query[:50]}...")
+            return cached
+
+        if _TAVILY_BREAKER.is_open():
+            print("⛔ Tavily circuit open — skipping search")
+            return _TOOL_UNAVAILABLE
+
+        try:
+            print(f"🔍 Searching for: {query[:50]}...")
+            async with _TAVILY_SEM:
+                results = await asyncio.wait_for(
+                    fetch_async(query), timeout=_TOOL_TIMEOUT
+                )
+            _TAVILY_BREAKER.record_success()
+            _TOOL_CACHE.set(cache_key, results, expire=cache_ttl)
+            return results
+        except Exception as e:
+            _TAVILY_BREAKER.record_failure()
+            print(f"Error in Tavily search: {e}")
+            return f"Search error: {str(e)}"
+
+    async def tavily_search_async(query, *args, **kwargs):
+        queries = _split_queries(query)
+        if len(queries) == 1:
+            return await search_one_async(queries[0])
+        results = await asyncio.gather(*[search_one_async(q) for q in queries])
+        seen = set()
+        return "\n\n".join(
+            f'Results for "{q}":\n{_dedupe_results(r, seen)}'
+            for q, r in zip(queries, results)
+        )
+
     return Tool(
         name="tavily_search_results",
-        func=tavily_search,
-        description="Search the web for current information. Use for recent events, news, and current data."
+        func=tavily_search_multi,
+        coroutine=tavily_search_async,
+        description=(
+            "Search the web for current information. Use for recent events, "
+            "news, and current data. To run several independent searches at "
+            "once, put each query on its own line — they execute in parallel."
+        )
     )
 
-@tool
-def get_current_datetime() -> str:
-    """Get the current date and time."""
-    now_utc = datetime.now(timezone.utc)
-    formatted_date = now_utc.strftime("%A, %B %d, %Y at %I:%M %p UTC")
-    return f"Current date and time: {formatted_date}"
-
 def create_wikipedia_tool():
     """Create a Wikipedia search tool."""
     try:
         api_wrapper = WikipediaAPIWrapper(top_k_results=2, doc_content_chars_max=2000)
-        
+
+        # Encyclopedic content is stable for weeks, so cache hits for 7 days
+        cache_ttl = 86400 * 7
+
+        @retry(
+            retry=retry_if_exception_type(requests.RequestException),
+            wait=wait_exponential_jitter(initial=1, max=30),
+            stop=stop_after_attempt(4),
+            reraise=True,
+        )
+        def run_with_retry(query):
+            return api_wrapper.run(query)
+
         def wiki_query(query):
             if not query or not isinstance(query, str):
                 return "Invalid query. Please provide a valid search term."
-            
+
             query = query.strip()[:300]
-            
+
+            cache_key = _tool_cache_key("wikipedia", query)
+            cached = _TOOL_CACHE.get(cache_key)
+            if cached is not None:
+                print(f"♻️ Wikipedia cache hit for: {query[:50]}...")
+                return cached
+
+            if _WIKI_BREAKER.is_open():
+                print("⛔ Wikipedia circuit open — skipping search")
+                return _TOOL_UNAVAILABLE
+
             try:
                 print(f"📚 Searching Wikipedia for: {query[:50]}...")
-                result = api_wrapper.run(query)
-                
-                if len(result) > 3000:
-                    result = result[:3000] + "... [content truncated]"
-                
-                wiki_url = f"https://en.wikipedia.org/wiki/{quote(query.replace(' ', '_'), safe='')}"
+                result = run_with_retry(query)
+                _WIKI_BREAKER.record_success()
+
+                result = result[:3000] + (
+                    "... [content truncated]" if len(result) > 3000 else ""
+                )
+
+                wiki_url = "https://en.wikipedia.org/wiki/" + quote(query.replace(" ", "_"), safe="")
                 result += f"\n\nSource: {wiki_url}"
-                
+
+                _TOOL_CACHE.set(cache_key, result, expire=cache_ttl)
                 return result
             except Exception as e:
+                _WIKI_BREAKER.record_failure()
                 print(f"Error in Wikipedia search: {e}")
                 return "Wikipedia search encountered an error. Please try a different query."
-        
+
+        def wiki_query_multi(query):
+            queries = _split_queries(query)
+            if len(queries) == 1:
+                return wiki_query(queries[0])
+            return "\n\n".join(
+                f'Results for "{q}":\n{wiki_query(q)}' for q in queries
+            )
+
+        async def query_one_async(query):
+            # WikipediaAPIWrapper is blocking; thread it off so lookups can
+            # run concurrently, bounded by the per-backend semaphore. The
+            # wait_for abandons a hung worker thread rather than pinning the
+            # event loop's caller on it.
+            async with _WIKI_SEM:
+                try:
+                    return await asyncio.wait_for(
+                        asyncio.to_thread(wiki_query, query),
+                        timeout=_TOOL_TIMEOUT,
+                    )
+                except asyncio.TimeoutError:
+                    _WIKI_BREAKER.record_failure()
+                    print(f"Wikipedia search timed out for: {query[:50]}...")
+                    return _TOOL_UNAVAILABLE
+
+        async def wiki_query_async(query):
+            queries = _split_queries(query)
+            if len(queries) == 1:
+                return await query_one_async(queries[0])
+            results = await asyncio.gather(*[query_one_async(q) for q in queries])
+            return "\n\n".join(
+                f'Results for "{q}":\n{r}' for q, r in zip(queries, results)
+            )
+
         return Tool(
             name="wikipedia_query_run",
-            func=wiki_query,
-            description="Search Wikipedia for established knowledge and historical information."
+            func=wiki_query_multi,
+            coroutine=wiki_query_async,
+            description=(
+                "Search Wikipedia for established knowledge and historical "
+                "information. To look up several topics at once, put each "
+                "query on its own line — they execute in parallel."
+            )
         )
     except Exception as e:
         print(f"Failed to initialize Wikipedia tool: {e}")
@@ -159,563 +551,750 @@ def initialize_tools():
         tools.append(wiki_tool)
         print("✅ Wikipedia tool initialized")
     
-    # DateTime
-    tools.append(get_current_datetime)
-    print("✅ DateTime tool initialized")
-    
     return tools
 
+# ============================================================================
+# AGENT PROMPTS
+# ============================================================================
+
+# Module-level constants so the prompt bytes are identical on every
+# invocation — the SQLite LLM cache keys on the exact request, and
+# Anthropic's server-side prompt cache (should these ever grow past its
+# minimum cacheable prefix — see make_prompt) keys on the exact prefix, so
+# any drift in the strings costs hits.
+
+PLANNING_PROMPT = """You are a research strategist. Decompose the user query into an actionable research plan.
+
+STEPS:
+1. Identify the core question and implicit sub-questions; classify the query
+   (factual/analytical/comparative/exploratory/evaluative), its temporal scope,
+   and its complexity.
+2. Separate primary (must-have) from secondary (nice-to-have) information needs.
+3. Design the search strategy: keywords and variations, source priorities
+   (Wikipedia for background, web for current), expected data types.
+
+OUTPUT (plain text):
+RESEARCH BLUEPRINT
+Core Question: / Query Type: / Temporal Scope: / Complexity:
+Primary Goals: (numbered, specific)
+Secondary Goals:
+Search Phase 1 (foundation): keywords, sources
+Search Phase 2 (deep dive): keywords, sources
+Success Criteria:
+Potential Challenges:
+"""
+
+SEARCH_PROMPT = """You are an information-retrieval specialist. Execute precise searches and extract high-quality findings.
+
+METHOD:
+1. Start broad for context, then narrow. Wikipedia for established facts;
+   web search for current events and diverse perspectives.
+2. When multiple independent lookups are needed, emit ALL tool_use blocks in
+   a single response so they execute in parallel.
+3. Batch related sub-queries into ONE tool call by putting each query on its
+   own line — they are fetched concurrently.
+4. Reformulate queries from initial results; add synonyms, exact phrases, or
+   date qualifiers as needed.
+5. Judge each source on authority, accuracy, currency, relevance, and bias.
+   Note explicitly when sources conflict.
+
+OUTPUT per round:
+SEARCH ROUND [N]
+Query Used: / Tool:
+KEY FINDINGS: bullet facts, each with source name and date
+QUALITY ASSESSMENT: credibility (High/Medium/Low), relevance, remaining gaps
+NEXT STEPS: further searches needed, if any
+
+Quality over quantity: 3 excellent sources beat 10 mediocre ones.
+"""
+
+CITATION_PROMPT = """You are a citation specialist and fact-checker.
+
+SOURCE TIERS:
+1. Peer-reviewed journals, .gov databases, major wire services, .edu sites.
+2. Industry reports, reputable think tanks, Wikipedia, professional bodies.
+3. General news sites, company sites, credentialed expert blogs.
+4. Opinion pieces, social media, unverified blogs — use with caution.
+
+TASKS:
+1. Cross-reference claims across sources; flag unsupported assertions and
+   potential bias; assign a confidence level to each claim.
+2. Format citations consistently: Author/Org. (Date). "Title". Source. URL.
+
+Report through the structured output schema: verified claims (each with
+sources and confidence), disputed topics, unsupported claims removed, the
+citation index, and an overall confidence score with recommendation.
+"""
+
+REFLECTION_PROMPT = """You are the quality gate for this research pipeline.
+
+ASSESS:
+1. Completeness — core question and sub-questions addressed at appropriate depth.
+2. Quality — source diversity, currency, statistical support, expert authority.
+3. Critique — bias, logical gaps, evidence strength, balance.
+4. User value — does this satisfy the query intent? Are limitations acknowledged?
+
+DECISION CRITERIA:
+- APPROVE for synthesis when the core question is fully addressed, key points
+  have multiple credible sources, there are no major gaps, and quality >= 7/10.
+- MORE RESEARCH needed when critical information is missing, important claims
+  rest on a single source, conflicts are unresolved, or quality < 7/10.
+
+Report through the structured output schema. Set decision per the criteria
+above; on MORE RESEARCH, list the exact information still needed and the
+suggested searches in gaps; on APPROVE, put emphasis and caveats for the
+report writer in synthesis_guidance.
+"""
+
+SYNTHESIS_PROMPT = """You are a research report writer. Turn the validated research into a polished report that directly answers the user's query.
+
+PRINCIPLES: clarity first; every claim cited; multiple perspectives presented
+fairly; practical implications included; professional but accessible tone
+(explain any necessary jargon). Target 500-800 words for standard queries.
+
+OUTPUT (Markdown):
+# Research Report
+## Executive Summary — 2-3 sentence direct answer with confidence level
+## Key Findings — prioritized bullets, each with evidence, source, confidence
+## Detailed Analysis — thematic sections with embedded citations
+## Practical Implications — decision-relevant insights, outlook, recommended actions
+## Limitations & Considerations — caveats, conflicts, open questions
+## Sources — numbered full citations, primary sources first
+
+End with: Research Confidence Score: X/10
+"""
+
 # ============================================================================
 # AGENT DEFINITIONS
 # ============================================================================
 
+# Structured output schemas for the intermediate review stages. Emitting
+# compact JSON instead of decorated Markdown cuts their generation tokens,
+# shrinks the transcript every later agent re-reads, and makes the routing
+# decision a field lookup instead of substring matching on prose.
+
+class VerifiedClaim(BaseModel):
+    claim: str
+    sources: List[str] = Field(default_factory=list)
+    confidence: Literal["high", "medium", "low"] = "medium"
+
+class CitationValidation(BaseModel):
+    """Citation agent output: what survived fact-checking, and how well."""
+    verified_claims: List[VerifiedClaim] = Field(default_factory=list)
+    disputed: List[str] = Field(
+        default_factory=list,
+        description="Topics where sources conflict, with both positions",
+    )
+    unsupported_removed: List[str] = Field(default_factory=list)
+    citations: List[str] = Field(
+        default_factory=list,
+        description='Full citations: Author/Org. (Date). "Title". Source. URL',
+    )
+    confidence_score: int = Field(ge=0, le=10)
+    recommendation: str
+
+class ReflectionScore(BaseModel):
+    """Reflection agent output: quality gate scores and the routing decision."""
+    completeness: int = Field(ge=0, le=10)
+    quality: int = Field(ge=0, le=10)
+    decision: Literal["approve", "more_research"]
+    gaps: List[str] = Field(
+        default_factory=list,
+        description="On more_research: exact missing information and suggested searches",
+    )
+    synthesis_guidance: List[str] = Field(
+        default_factory=list,
+        description="On approve: emphasis and caveats for the report writer",
+    )
+
 def create_agents(available_tools):
     """Create all specialized agents for the research system."""
-    
+
+    def make_prompt(system_text):
+        """Build a prompt callable with a cacheable prefix and a fresh date.
+
+        The static system text is marked with cache_control for Anthropic's
+        server-side prompt cache. Honest caveat: since the prompts were
+        compressed, each sits at roughly 150-250 tokens — below the minimum
+        cacheable prefix (1024 tokens on Sonnet, 2048 on Haiku) — so the
+        marker is currently a no-op and the API simply ignores it. It is
+        kept, and the structure (static block first, dynamic content
+        strictly after) preserved, so that caching kicks in without code
+        changes if the prompts or tool schemas ever grow past the
+        threshold. Don't chase missing cache_read tokens in the logs before
+        checking these sizes. The date stamp gives agents temporal context
+        without spending an LLM round-trip on a get-current-time tool call;
+        it is deliberately day-granular, because anything finer would put a
+        changing string in every request and the SQLite LLM cache is an
+        exact match on the serialized messages — a minute-level stamp made
+        it miss for a whole pipeline's worth of identical calls.
+        """
+        def prompt(state):
+            stamp = datetime.now(timezone.utc).strftime("%A, %B %d, %Y")
+            return [
+                SystemMessage(content=[
+                    {
+                        "type": "text",
+                        "text": system_text,
+                        "cache_control": {"type": "ephemeral"},
+                    },
+                    {"type": "text", "text": f"Current UTC date: {stamp}."},
+                ])
+            ] + state["messages"]
+        return prompt
+
+    # Right-size the output cap per agent instead of sharing one global
+    # ceiling — Anthropic bills output tokens and may generate up to the cap,
+    # so oversized limits inflate cost and tail latency on the short-form
+    # agents. The thinking-enabled search agent carries its 1024-token
+    # thinking budget on top of the visible-output cap.
+    planning_model = claude_haiku.model_copy(update={"max_tokens": 500})
+    citation_model = claude_haiku.model_copy(update={"max_tokens": 600})
+    search_model = claude_thinking.model_copy(update={"max_tokens": 1500 + 1024})
+    reflection_model = claude_haiku.model_copy(update={"max_tokens": 400})
+    synthesis_model = claude_fast.model_copy(update={"max_tokens": 2500})
+
     # Planning Agent - Enhanced with structured thinking and comprehensive planning
     planning_agent = create_react_agent(
-        model=claude,
+        model=planning_model,
         tools=[],
         name="planning_expert",
-        prompt="""You are an expert research strategist specializing in decomposing complex queries into actionable research plans.
-
-        YOUR MISSION:
-        Transform user queries into structured, comprehensive research strategies that guide the entire research process.
-        
-        ANALYSIS FRAMEWORK:
-        1. Query Decomposition:
-           - Identify core question and implicit sub-questions
-           - Detect query type: factual, analytical, comparative, exploratory, or evaluative
-           - Determine temporal scope (current, historical, predictive)
-           - Assess complexity level and required depth
-        
-        2. Information Architecture:
-           - Primary information needs (must-have)
-           - Secondary information needs (nice-to-have)
-           - Potential information gaps and how to address them
-        
-        3. Search Strategy Design:
-           - Optimal search keywords and variations
-           - Information source priorities (web vs Wikipedia)
-           - Expected data types (statistics, opinions, facts, trends)
-        
-        OUTPUT FORMAT:
-        ╔══════════════════════════════════════╗
-        ║         RESEARCH BLUEPRINT           ║
-        ╚══════════════════════════════════════╝
-        
-        📋 QUERY ANALYSIS
-        • Core Question: [Precise reformulation of user query]
-        • Query Type: [Factual/Analytical/Comparative/Exploratory/Evaluative]
-        • Temporal Scope: [Current/Historical/Future/Mixed]
-        • Complexity: [Simple/Moderate/Complex/Multi-dimensional]
-        
-        🎯 RESEARCH OBJECTIVES
-        Primary Goals:
-        1. [Specific, measurable objective]
-        2. [Specific, measurable objective]
-        
-        Secondary Goals:
-        • [Supporting objective]
-        
-        🔍 SEARCH STRATEGY
-        Phase 1 - Foundation:
-        • Keywords: [primary terms, variations]
-        • Sources: [Wikipedia for background, Web for current]
-        
-        Phase 2 - Deep Dive:
-        • Keywords: [specialized terms, related concepts]
-        • Sources: [Specific focus areas]
-        
-        ✅ SUCCESS CRITERIA
-        • [Specific condition that indicates complete answer]
-        • [Quality threshold for sources]
-        • [Coverage requirement]
-        
-        ⚠️ POTENTIAL CHALLENGES
-        • [Anticipated difficulty and mitigation]
-        """
+        prompt=make_prompt(PLANNING_PROMPT)
     )
     
     # Search Agent - Enhanced with intelligent search tactics
     search_agent = create_react_agent(
-        model=claude,
+        model=search_model,
         tools=available_tools,
         name="search_expert",
-        prompt="""You are an elite information retrieval specialist with expertise in strategic searching and source evaluation.
-        
-        YOUR MISSION:
-        Execute precise, efficient searches that maximize information quality while minimizing redundancy.
-        
-        SEARCH METHODOLOGY:
-        
-        1. Search Execution Protocol:
-           • Start broad for context, then narrow for specifics
-           • Use Wikipedia for established facts and background
-           • Use web search for current events, trends, and diverse perspectives
-           • Combine multiple search angles to ensure comprehensive coverage
-        
-        2. Query Optimization:
-           • Reformulate queries based on initial results
-           • Use quotation marks for exact phrases when needed
-           • Include synonyms and related terms
-           • Add date filters for time-sensitive information
-        
-        3. Source Evaluation Matrix:
-           ✓ Authority: Is the source credible and recognized?
-           ✓ Accuracy: Can the information be verified?
-           ✓ Currency: Is the information up-to-date?
-           ✓ Relevance: Does it directly address the query?
-           ✓ Objectivity: Is there evident bias?
-        
-        4. Information Extraction:
-           • Capture key facts with their specific context
-           • Note conflicting information from different sources
-           • Identify statistical data and quantitative evidence
-           • Record expert opinions and their credentials
-        
-        SEARCH EXECUTION FORMAT:
-        
-        🔍 SEARCH ROUND [N]
-        Query Used: "[exact query]"
-        Tool: [tavily_search_results/wikipedia_query_run]
-        
-        KEY FINDINGS:
-        • [Fact/Data point] - Source: [Name, Date]
-        • [Fact/Data point] - Source: [Name, Date]
-        
-        QUALITY ASSESSMENT:
-        • Credibility: [High/Medium/Low]
-        • Relevance: [Direct/Partial/Tangential]
-        • Information Gaps: [What's still missing]
-        
-        NEXT STEPS:
-        [What additional searches are needed, if any]
-        
-        Remember: Quality over quantity. 3 excellent sources > 10 mediocre ones.
-        Always note when information conflicts between sources.
-        """
+        prompt=make_prompt(SEARCH_PROMPT)
     )
     
-    # Citation Agent - Enhanced with academic-level citation standards
-    citation_agent = create_react_agent(
-        model=claude,
-        tools=[],
-        name="citation_expert",
-        prompt="""You are a meticulous citation specialist and fact-checker with expertise in academic integrity and source validation.
-        
-        YOUR MISSION:
-        Ensure every claim is properly supported, every source is credible, and all citations meet professional standards.
-        
-        VALIDATION FRAMEWORK:
-        
-        1. Source Credibility Assessment:
-           🏆 Tier 1 (Highest Trust):
-           • Peer-reviewed journals
-           • Government databases (.gov)
-           • Established news organizations (Reuters, AP, BBC)
-           • Academic institutions (.edu)
-           
-           📊 Tier 2 (High Trust):
-           • Industry reports from recognized firms
-           • Reputable think tanks
-           • Wikipedia (for established facts)
-           • Professional associations
-           
-           ⚠️ Tier 3 (Moderate Trust):
-           • General news websites
-           • Company websites (for company-specific info)
-           • Expert blogs with credentials
-           
-           🚫 Tier 4 (Use with Caution):
-           • Opinion pieces
-           • Social media
-           • Unverified blogs
-           • Sites with clear bias
-        
-        2. Fact Verification Protocol:
-           • Cross-reference claims across multiple sources
-           • Flag any unsupported assertions
-           • Identify potential bias or conflicts of interest
-           • Note confidence level for each claim
-        
-        3. Citation Formatting:
-           • Include: Author/Organization, Title, Date, URL (if applicable)
-           • Use consistent format throughout
-           • Group similar sources
-           • Highlight primary vs. supporting sources
-        
-        OUTPUT FORMAT:
-        
-        ✅ VALIDATION REPORT
-        
-        VERIFIED CLAIMS:
-        1. "[Claim]" 
-           • Sources: [Source 1], [Source 2]
-           • Confidence: [High/Medium/Low]
-           • Notes: [Any caveats or context]
-        
-        ⚠️ DISPUTED/CONFLICTING INFORMATION:
-        • Topic: [What's disputed]
-        • Source A says: [Position]
-        • Source B says: [Different position]
-        • Recommendation: [How to present this]
-        
-        🚫 UNSUPPORTED CLAIMS REMOVED:
-        • [Claim that couldn't be verified]
-        
-        📚 CITATION INDEX:
-        [1] Author/Org. (Date). "Title". Source. URL
-        [2] Author/Org. (Date). "Title". Source. URL
-        
-        OVERALL CONFIDENCE SCORE: [X/10]
-        RECOMMENDATION: [Proceed/Need additional verification/Major concerns]
+    def make_structured_node(model, schema, system_text, name):
+        """Direct structured-output node for the tool-less review agents.
+
+        create_react_agent wraps every call in a think-act loop these agents
+        never use, and structured output rides the same tool-calling channel
+        the react scaffold occupies — so they get a single ainvoke returning
+        the schema instead. The JSON lands in state as a compact AIMessage
+        that downstream agents read without re-parsing Markdown.
         """
+        build_messages = make_prompt(system_text)
+        chain = model.with_structured_output(schema)
+
+        async def node(state):
+            result = await chain.ainvoke(build_messages(state))
+            return {
+                "messages": [AIMessage(content=result.model_dump_json(), name=name)]
+            }
+        return node
+
+    # Citation Agent - structured fact-check verdict, not prose
+    citation_agent = make_structured_node(
+        citation_model, CitationValidation, CITATION_PROMPT, "citation_expert"
     )
-    
-    # Reflection Agent - Enhanced with comprehensive quality assessment
-    reflection_agent = create_react_agent(
-        model=claude,
-        tools=[],
-        name="reflection_expert",
-        prompt="""You are a senior quality assurance specialist and critical analysis expert responsible for ensuring research excellence.
-        
-        YOUR MISSION:
-        Rigorously evaluate the research quality, identify gaps, and ensure the final output will fully satisfy the user's needs.
-        
-        EVALUATION FRAMEWORK:
-        
-        1. Completeness Assessment:
-           ☐ Does the research address the core question?
-           ☐ Are all sub-questions answered?
-           ☐ Is the depth appropriate for the query complexity?
-           ☐ Are there logical follow-up questions addressed?
-        
-        2. Quality Metrics:
-           • Source Diversity: Are multiple viewpoints represented?
-           • Temporal Coverage: Is the information current?
-           • Geographic Relevance: Is the scope appropriate?
-           • Statistical Support: Are claims backed by data?
-           • Expert Authority: Are credible experts cited?
-        
-        3. Critical Analysis:
-           • Identify potential biases in sources or coverage
-           • Spot logical inconsistencies or gaps
-           • Assess strength of evidence for key claims
-           • Evaluate balance and objectivity
-        
-        4. User Value Assessment:
-           • Will this answer satisfy the user's intent?
-           • Is the information actionable/useful?
-           • Are limitations clearly acknowledged?
-           • Is the complexity level appropriate?
-        
-        DECISION CRITERIA:
-        
-        ✅ APPROVE for synthesis when:
-        • Core question fully addressed (>90% complete)
-        • Multiple credible sources support key points
-        • No major information gaps
-        • Quality score ≥ 7/10
-        
-        🔄 REQUEST MORE RESEARCH when:
-        • Critical information missing
-        • Single-source dependency on important claims
-        • Conflicting information unresolved
-        • Quality score < 7/10
-        
-        OUTPUT FORMAT:
-        
-        📊 QUALITY ASSESSMENT REPORT
-        
-        COMPLETENESS: [X/10]
-        • Core Question: [Fully/Partially/Inadequately] addressed
-        • Information Gaps: [None/Minor/Major]
-        
-        QUALITY: [X/10]
-        • Source Quality: [Excellent/Good/Fair/Poor]
-        • Evidence Strength: [Strong/Moderate/Weak]
-        • Balance: [Well-balanced/Somewhat biased/Heavily biased]
-        
-        DECISION: [APPROVE for synthesis / MORE RESEARCH needed]
-        
-        IF MORE RESEARCH:
-        Specific Requirements:
-        1. [Exact information needed]
-        2. [Suggested search approach]
-        
-        IF APPROVED:
-        Key Strengths:
-        • [What was done well]
-        Synthesis Guidance:
-        • [Specific emphasis for final report]
-        • [Any caveats to include]
-        """
+
+    # Reflection Agent - structured quality scores and routing decision
+    reflection_agent = make_structured_node(
+        reflection_model, ReflectionScore, REFLECTION_PROMPT, "reflection_expert"
     )
-    
+
+
     # Synthesis Agent - Enhanced with professional report writing
     synthesis_agent = create_react_agent(
-        model=claude,
+        model=synthesis_model,
         tools=[],
         name="synthesis_expert",
-        prompt="""You are a master research synthesist and professional report writer specializing in creating comprehensive, accessible, and actionable research reports.
-        
-        YOUR MISSION:
-        Transform raw research into a polished, professional report that directly answers the user's query with clarity, depth, and actionable insights.
-        
-        SYNTHESIS PRINCIPLES:
-        1. Clarity First: Complex ideas explained simply
-        2. Evidence-Based: Every claim supported by citations
-        3. Actionable: Include practical implications
-        4. Balanced: Present multiple perspectives fairly
-        5. Structured: Logical flow from overview to details
-        
-        REPORT ARCHITECTURE:
-        
-        1. Executive Summary (2-3 sentences):
-           • Direct answer to the main question
-           • Most important insight or finding
-           • Confidence level in the conclusion
-        
-        2. Key Findings (Bulleted, prioritized):
-           • Start with most important/relevant
-           • Include supporting evidence
-           • Note confidence level if variable
-        
-        3. Detailed Analysis:
-           • Organized by themes or chronology
-           • Smooth transitions between sections
-           • Context for complex topics
-           • Multiple viewpoints where relevant
-        
-        4. Practical Implications:
-           • What this means for the reader
-           • Actionable recommendations
-           • Future considerations
-        
-        5. Limitations & Caveats:
-           • What we don't know
-           • Conflicting information
-           • Areas needing more research
-        
-        OUTPUT FORMAT:
-        
-        ═══════════════════════════════════════
-                  RESEARCH REPORT
-        ═══════════════════════════════════════
-        
-        📋 EXECUTIVE SUMMARY
-        [2-3 sentence direct answer with confidence level]
-        
-        🎯 KEY FINDINGS
-        
-        1. **[Most Important Finding]**
-           • Evidence: [Supporting data/fact]
-           • Source: [Citation]
-           • Confidence: High
-        
-        2. **[Second Finding]**
-           • Evidence: [Supporting data/fact]
-           • Source: [Citation]
-           • Confidence: High/Medium
-        
-        3. **[Third Finding]**
-           • Evidence: [Supporting data/fact]
-           • Source: [Citation]
-           • Confidence: High/Medium
-        
-        📊 DETAILED ANALYSIS
-        
-        [Thematic Section 1]
-        [Comprehensive paragraph with embedded citations]
-        
-        [Thematic Section 2]
-        [Comprehensive paragraph with embedded citations]
-        
-        [Additional sections as needed]
-        
-        💡 PRACTICAL IMPLICATIONS
-        
-        • For Decision-Making: [Actionable insight]
-        • Future Outlook: [Trend or projection]
-        • Recommended Actions: [If applicable]
-        
-        ⚠️ LIMITATIONS & CONSIDERATIONS
-        
-        • [Any significant caveats]
-        • [Conflicting information noted]
-        • [Areas requiring further research]
-        
-        📚 SOURCES
-        
-        Primary Sources:
-        [1] [Full citation]
-        [2] [Full citation]
-        
-        Supporting Sources:
-        [3] [Full citation]
-        [4] [Full citation]
-        
-        ═══════════════════════════════════════
-        Research Confidence Score: [X/10]
-        Report Generated: [Timestamp]
-        ═══════════════════════════════════════
-        
-        TONE: Professional yet accessible. Avoid jargon unless necessary (then explain it).
-        LENGTH: Comprehensive but concise. Target 500-800 words for standard queries.
-        """
+        prompt=make_prompt(SYNTHESIS_PROMPT)
     )
     
     return planning_agent, search_agent, citation_agent, reflection_agent, synthesis_agent
 
 # ============================================================================
-# SUPERVISOR SETUP
+# PLAN TEMPLATE CACHE
 # ============================================================================
 
-def create_research_supervisor(agents, claude_model):
-    """Create the supervisor that orchestrates all agents."""
-    
-    supervisor = create_supervisor(
-        agents,
-        model=claude_model,
-        prompt="""You are the Chief Research Coordinator orchestrating a team of specialized AI agents to deliver exceptional research results.
-        
-        YOUR ROLE:
-        Direct and coordinate your team of experts to produce comprehensive, accurate, and actionable research reports.
-        
-        YOUR TEAM:
-        • planning_expert: Creates research strategies and blueprints
-        • search_expert: Executes searches (ONLY agent with search tools)
-        • citation_expert: Validates sources and ensures credibility
-        • reflection_expert: Quality assurance and gap analysis
-        • synthesis_expert: Creates final polished reports
-        
-        WORKFLOW ORCHESTRATION:
-        
-        Phase 1 - PLANNING (planning_expert)
-        → Send user query for strategic analysis
-        → Receive research blueprint
-        → Confirm approach aligns with user needs
-        
-        Phase 2 - INFORMATION GATHERING (search_expert)
-        → Provide research blueprint to search expert
-        → Monitor search progress
-        → Ensure comprehensive coverage
-        → May require 2-3 rounds for complex queries
-        
-        Phase 3 - VALIDATION (citation_expert)
-        → Send all gathered information for verification
-        → Ensure source credibility
-        → Resolve any conflicting information
-        
-        Phase 4 - QUALITY CHECK (reflection_expert)
-        → Submit validated research for assessment
-        → If gaps identified, return to Phase 2
-        → If approved, proceed to synthesis
-        
-        Phase 5 - SYNTHESIS (synthesis_expert)
-        → Provide all validated research
-        → Include any specific guidance from reflection
-        → Deliver final report to user
-        
-        COORDINATION PRINCIPLES:
-        
-        1. Clarity in Delegation:
-           • Give each agent clear, specific instructions
-           • Include relevant context from previous phases
-           • Set explicit success criteria
-        
-        2. Iterative Refinement:
-           • Don't hesitate to loop back if quality insufficient
-           • Maximum 2 additional search rounds if needed
-           • Balance thoroughness with efficiency
-        
-        3. Quality Standards:
-           • Never compromise on source credibility
-           • Ensure direct answer to user's question
-           • Maintain professional presentation
-        
-        4. Communication Style:
-           • Be concise in inter-agent communication
-           • Focus on essential information transfer
-           • Preserve important details and nuance
-        
-        DECISION POINTS:
-        
-        After Planning → Proceed if plan is clear and comprehensive
-        After Search → Proceed if sufficient quality information gathered
-        After Citation → Proceed if sources are credible
-        After Reflection → Loop back OR proceed to synthesis
-        After Synthesis → Deliver to user
-        
-        REMEMBER:
-        • Only search_expert can perform searches
-        • Quality > Speed (but be efficient)
-        • User satisfaction is the ultimate goal
-        • Keep the user's original query as the north star
+# Research blueprints have strong structural locality: queries of the same
+# type over the same key terms produce near-identical plans, so reuse them
+# instead of re-running the planning agent. A one-word Haiku classification
+# is far cheaper than a full blueprint generation.
+_PLAN_CACHE = TTLCache(maxsize=256, ttl=86400)
+
+_QUERY_TYPES = ("factual", "analytical", "comparative", "exploratory", "evaluative")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the to "
+    "what when where which who why with".split()
+)
+
+async def classify_query(query):
+    """Classify the query type with a single-word Haiku call."""
+    response = await claude_haiku.ainvoke([
+        SystemMessage(content=(
+            "Classify the research query as exactly one of: factual, "
+            "analytical, comparative, exploratory, evaluative. "
+            "Reply with the single word only."
+        )),
+        HumanMessage(content=query),
+    ])
+    text = response.content if isinstance(response.content, str) else str(response.content)
+    text = text.strip().lower()
+    for query_type in _QUERY_TYPES:
+        if query_type in text:
+            return query_type
+    return "exploratory"
+
+def _plan_cache_key(query_type, query):
+    """Key blueprints on query type plus the set of salient keywords."""
+    words = sorted({
+        w for w in re.findall(r"[a-z0-9]+", query.lower())
+        if w not in _STOPWORDS
+    })
+    digest = hashlib.blake2b(" ".join(words).encode(), digest_size=8).hexdigest()
+    return f"{query_type}:{digest}"
+
+# ============================================================================
+# RESEARCH GRAPH SETUP
+# ============================================================================
+
+def create_research_graph(agents):
+    """Build the research workflow as an explicit StateGraph.
+
+    The workflow is deterministic, so the hand-offs are encoded as graph
+    edges instead of routing every transition through a supervisor LLM.
+    Two stages run speculatively in parallel to shorten the critical path:
+
+    - Planning and the first search round both start immediately from the
+      user query. The search agent formulates its own queries anyway, so
+      its ~15s round-trip overlaps planning's ~10s instead of waiting on it.
+    - Citation and reflection both consume the same search output and are
+      independent of each other, so they run as parallel branches of the
+      same superstep and join before synthesis.
+
+    The one data-dependent decision — reflection finding gaps between the
+    blueprint and the speculative results — is a cheap conditional edge that
+    runs a single targeted follow-up search before synthesis, not an LLM
+    routing turn.
+    """
+    planning_agent, search_agent, citation_agent, reflection_agent, synthesis_agent = agents
+
+    async def planning(state):
+        """Planning agent with the blueprint template cache in front.
+
+        On a hit the cached blueprint is injected as the planning output and
+        the planning LLM call is skipped entirely; the classify call that
+        decides the cache key is a one-word Haiku turn.
+        """
+        humans = [m for m in state["messages"] if isinstance(m, HumanMessage)]
+        query = humans[-1].content if humans else ""
+
+        query_type = await classify_query(query)
+        key = _plan_cache_key(query_type, query)
+
+        cached = _PLAN_CACHE.get(key)
+        if cached is not None:
+            print(f"♻️ Blueprint cache hit ({query_type}) for: {query[:50]}...")
+            return {"messages": [AIMessage(content=cached, name="planning_expert")]}
+
+        result = await planning_agent.ainvoke(state)
+
+        blueprint = result["messages"][-1] if result.get("messages") else None
+        if isinstance(blueprint, AIMessage) and isinstance(blueprint.content, str):
+            _PLAN_CACHE[key] = blueprint.content
+        return result
+
+    def reconcile(state):
+        """Join point where the speculative search meets the blueprint.
+
+        Both outputs are already in state for the reviewers; any mismatch
+        between what planning wanted and what the speculative search found is
+        reflection's job to flag, which triggers the follow-up round.
+
+        Parallel tool calls with overlapping queries can also return the same
+        payload more than once, so duplicate tool outputs are collapsed to a
+        stub here — before citation and reflection each re-read the full
+        transcript. The duplicate ToolMessage must stay in place (Anthropic
+        rejects a transcript whose tool_use block has no matching
+        tool_result), so its content is replaced rather than the message
+        removed; returning a message with an existing id swaps it in state.
+        """
+        replacements = []
+        seen = set()
+        for m in state["messages"]:
+            if not isinstance(m, ToolMessage) or m.id is None:
+                continue
+            digest = hashlib.blake2b(
+                str(m.content).encode(), digest_size=8
+            ).hexdigest()
+            if digest in seen:
+                replacements.append(m.model_copy(update={
+                    "content": "[duplicate of an earlier tool result — see above]"
+                }))
+            else:
+                seen.add(digest)
+        return {"messages": replacements}
+
+    def _strip_tool_traffic(state):
+        """Drop raw tool outputs and the assistant turns that requested them.
+
+        Synthesis runs with tools=[], and Anthropic rejects transcripts
+        carrying tool_use/tool_result blocks when the request defines no
+        tools — beyond that, the raw payloads are tokens synthesis should
+        never re-read once they're distilled into the expert reports.
+        """
+        removals = []
+        for m in state["messages"]:
+            if m.id is None:
+                continue
+            if isinstance(m, ToolMessage):
+                removals.append(RemoveMessage(id=m.id))
+            elif isinstance(m, AIMessage) and m.tool_calls:
+                removals.append(RemoveMessage(id=m.id))
+        return {"messages": removals}
+
+    def review_gate(state):
+        """Join the parallel review branches and trim consumed scaffolding.
+
+        By this point the raw tool outputs and the assistant turns that
+        requested them have been distilled into the search, citation, and
+        reflection reports, so drop them from state rather than re-sending
+        them to every remaining LLM turn — synthesis is the fattest call in
+        the pipeline and only needs the distilled reports.
         """
+        return _strip_tool_traffic(state)
+
+    def route_after_review(state):
+        """Run one targeted follow-up search if reflection found gaps."""
+        reflections = [
+            m for m in state["messages"]
+            if isinstance(m, AIMessage) and getattr(m, "name", None) == "reflection_expert"
+        ]
+        if reflections:
+            content = reflections[-1].content
+            if isinstance(content, list):
+                content = " ".join(
+                    block.get("text", "") for block in content
+                    if isinstance(block, dict) and block.get("type") == "text"
+                )
+            try:
+                decision = json.loads(content).get("decision")
+            except (json.JSONDecodeError, AttributeError):
+                # Fall back to keyword matching if the payload isn't the
+                # expected ReflectionScore JSON
+                decision = "more_research" if "MORE RESEARCH" in content else "approve"
+            if decision == "more_research":
+                return "followup_search"
+        return "synthesis"
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("planning", planning)
+    graph.add_node("search", search_agent)
+    graph.add_node("reconcile", reconcile)
+    graph.add_node("citation", citation_agent)
+    graph.add_node("reflection", reflection_agent)
+    graph.add_node("review_gate", review_gate)
+    # Same search agent, second node: the gap-fill round reflection can
+    # request. A distinct node keeps the planning+search join barrier intact
+    # and bounds the pipeline at one extra round.
+    graph.add_node("followup_search", search_agent)
+    # The follow-up round reintroduces tool traffic after review_gate already
+    # trimmed it, so it gets the same scrub before synthesis
+    graph.add_node("followup_trim", _strip_tool_traffic)
+    graph.add_node("synthesis", synthesis_agent)
+
+    graph.add_edge(START, "planning")
+    graph.add_edge(START, "search")
+    graph.add_edge(["planning", "search"], "reconcile")
+    # Plain parallel edges: the Pregel runtime dispatches both reviewers in
+    # the same superstep once reconcile completes — no dynamic Send dispatch
+    # needed for a static fan-out
+    graph.add_edge("reconcile", "citation")
+    graph.add_edge("reconcile", "reflection")
+    graph.add_edge(["citation", "reflection"], "review_gate")
+    graph.add_conditional_edges(
+        "review_gate", route_after_review, ["followup_search", "synthesis"]
     )
-    
-    return supervisor
+    graph.add_edge("followup_search", "followup_trim")
+    graph.add_edge("followup_trim", "synthesis")
+    graph.add_edge("synthesis", END)
+
+    return graph
+
+# ============================================================================
+# BUILD THE APPLICATION ONCE
+# ============================================================================
+
+# Tools, agents, and the compiled graph are all reusable across requests, so
+# build them once at import time instead of on every Gradio submit. The
+# SQLite-backed checkpointer makes threads durable across requests, worker
+# processes, and restarts, so a follow-up question on the same thread resumes
+# prior research state instead of starting cold.
+print("🔧 Initializing tools...")
+_TOOLS = initialize_tools()
+
+print("🤖 Creating agents...")
+_AGENTS = create_agents(_TOOLS)
+
+print("🗺️ Building research graph...")
+_GRAPH = create_research_graph(_AGENTS)
+
+# The graph is only ever driven through async entry points (astream_events,
+# abatch, aget_state), and the sync SqliteSaver raises NotImplementedError
+# from its async methods — the checkpointer must be the aio variant. That
+# variant binds to the running event loop (its constructor grabs the loop,
+# and its internal asyncio.Lock pins to whichever loop first acquires it),
+# so it cannot be built at import time and one cached instance cannot be
+# shared across loops. The compiled app is therefore built lazily, once per
+# event loop; in practice that is one app for Gradio's loop and one for the
+# sync callers' dedicated loop. They share the checkpoint database safely —
+# it runs in WAL mode.
+_APPS = {}
+_APPS_LOCK = threading.Lock()
+
+async def _get_app():
+    loop_key = id(asyncio.get_running_loop())
+    app = _APPS.get(loop_key)
+    if app is None:
+        with _APPS_LOCK:
+            app = _APPS.get(loop_key)
+            if app is None:
+                # WAL lets checkpoint writes proceed while readers are open —
+                # the default rollback journal serializes them, which shows
+                # up as stalls once parallel branches checkpoint
+                # concurrently. journal_mode persists in the database file,
+                # so one short-lived sync connection sets it for the saver.
+                with sqlite3.connect("checkpoints.db") as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                aio_conn = aiosqlite.connect("checkpoints.db")
+                # aiosqlite's worker is a non-daemon thread; left alone it
+                # blocks interpreter exit for script callers, so let it die
+                # with the process — checkpoint writes are awaited before
+                # any caller returns, so nothing in flight is lost. Older
+                # aiosqlite subclasses Thread directly; 0.22+ wraps the
+                # worker in a private _thread.
+                getattr(aio_conn, "_thread", aio_conn).daemon = True
+                app = _GRAPH.compile(checkpointer=AsyncSqliteSaver(aio_conn))
+                _APPS[loop_key] = app
+    return app
 
 # ============================================================================
 # RESEARCH FUNCTION
 # ============================================================================
 
-def conduct_research(query):
-    """Conduct research using the multi-agent system."""
+def _extract_report(result):
+    """Pull the final text content out of a graph invocation result."""
+    if result and "messages" in result and result["messages"]:
+        last_message = result["messages"][-1]
+        if hasattr(last_message, 'content'):
+            content = last_message.content
+            if isinstance(content, str):
+                return content
+            elif isinstance(content, list):
+                text_parts = []
+                for block in content:
+                    if isinstance(block, dict) and block.get('type') == 'text':
+                        text_parts.append(block.get('text', ''))
+                return '\n'.join(text_parts)
+
+    return "Research completed but no results were generated."
+
+# Whole-pipeline cache: repeated questions (common in a demo — example
+# buttons, reloads, several users trying the same prompt) short-circuit all
+# five agents and return the finished report instantly. One hour TTL keeps
+# current-events answers from going stale.
+_REPORT_CACHE = TTLCache(maxsize=256, ttl=3600)
+
+def _report_cache_key(query):
+    """Normalize whitespace and case so trivial rephrasings share a key."""
+    return " ".join(query.lower().split())
+
+def _thread_id_for(query):
+    """Derive a stable thread id from the normalized query.
+
+    A re-run of the same question lands on the same checkpoint thread and
+    resumes its accumulated research state — even across process restarts —
+    instead of starting from a cold, random uuid thread.
+
+    Known hazard: two sessions submitting the same question concurrently
+    share one checkpoint thread with no locking, so their runs interleave
+    checkpoints. In practice the report cache short-circuits the second
+    submission once the first finishes, and the worst case is a wasted
+    duplicate run — but if that ever bites, salt this id per session (at
+    the cost of cross-session resume).
+    """
+    digest = hashlib.blake2b(
+        _report_cache_key(query).encode(), digest_size=8
+    ).hexdigest()
+    return f"research_{digest}"
+
+def _chunk_text(chunk):
+    """Extract plain text from a streamed chat model chunk."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return ''.join(
+            block.get('text', '') for block in content
+            if isinstance(block, dict) and block.get('type') == 'text'
+        )
+    return ''
+
+async def conduct_research(query, thread_id=None):
+    """Conduct research and stream the final report as it is written.
+
+    The pipeline still takes its full 30-90s, but streaming the synthesis
+    tokens as Claude emits them drops perceived latency to time-to-first-token
+    and lets the user abort early. Gradio treats async generators as
+    streaming outputs natively.
+
+    The thread_id rides along in hidden Gradio state: follow-up questions in
+    the same session reuse it, so the durable checkpointer resumes prior
+    research context instead of starting from scratch.
+    """
     if not query.strip():
-        return "Please enter a research question."
-    
+        yield "Please enter a research question.", thread_id
+        return
+
+    cache_key = _report_cache_key(query)
+    cached_report = _REPORT_CACHE.get(cache_key)
+    if cached_report is not None:
+        print(f"♻️ Report cache hit for: {query[:50]}...")
+        yield cached_report, thread_id
+        return
+
     try:
-        # Initialize tools
-        print("\n🔧 Initializing tools...")
-        available_tools = initialize_tools()
-        
-        # Create agents
-        print("🤖 Creating agents...")
-        agents = create_agents(available_tools)
-        
-        # Create supervisor
-        print("👨‍💼 Creating supervisor...")
-        supervisor = create_research_supervisor(agents, claude)
-        
-        # Compile with memory
-        memory = MemorySaver()
-        app = supervisor.compile(checkpointer=memory)
-        
-        # Create config
-        thread_id = f"research_{uuid.uuid4().hex[:8]}"
-        config = {"configurable": {"thread_id": thread_id}}
-        
+        # Create config, reusing the session's thread when one exists
+        if not thread_id:
+            thread_id = _thread_id_for(query)
+        config = {
+            "configurable": {"thread_id": thread_id},
+            "recursion_limit": RECURSION_LIMIT,
+        }
+
         print(f"\n🔍 Researching: {query}\n")
         print("=" * 50)
-        
-        # Run research
-        result = app.invoke(
+
+        yield "🔍 Researching... the report will stream here as it is written.", thread_id
+
+        app = await _get_app()
+
+        report = ""
+        async for event in app.astream_events(
             {"messages": [HumanMessage(content=query)]},
-            config
-        )
-        
-        # Extract response
-        if result and "messages" in result and result["messages"]:
-            last_message = result["messages"][-1]
-            if hasattr(last_message, 'content'):
-                content = last_message.content
-                if isinstance(content, str):
-                    return content
-                elif isinstance(content, list):
-                    text_parts = []
-                    for block in content:
-                        if isinstance(block, dict) and block.get('type') == 'text':
-                            text_parts.append(block.get('text', ''))
-                    return '\n'.join(text_parts)
-        
-        return "Research completed but no results were generated."
-        
+            config,
+            version="v2"
+        ):
+            if event["event"] == "on_chat_model_end":
+                # Surface prompt-cache reads when they happen. Note the
+                # current compressed prompts are below Anthropic's minimum
+                # cacheable prefix (see make_prompt), so zero reads here is
+                # expected, not a regression.
+                usage = getattr(event["data"].get("output"), "usage_metadata", None)
+                if usage:
+                    cache_reads = usage.get("input_token_details", {}).get("cache_read", 0)
+                    if cache_reads:
+                        print(f"♻️ Prompt cache: {cache_reads} input tokens read from cache")
+                continue
+
+            if event["event"] != "on_chat_model_stream":
+                continue
+
+            # Only surface tokens from the synthesis node; the other agents'
+            # output is working material, not the report
+            ns = event.get("metadata", {}).get("langgraph_checkpoint_ns", "")
+            if not ns.startswith("synthesis"):
+                continue
+
+            text = _chunk_text(event["data"]["chunk"])
+            if text:
+                report += text
+                yield report, thread_id
+
+        if not report:
+            # Nothing streamed (e.g. a fully cached response) — fall back to
+            # reading the final checkpoint
+            state = await app.aget_state(config)
+            report = _extract_report(state.values)
+            yield report, thread_id
+
+        _REPORT_CACHE[cache_key] = report
+
     except Exception as e:
         error_msg = f"Error during research: {str(e)}"
         print(f"❌ {error_msg}")
+        yield error_msg, thread_id
+
+_SYNC_LOOP = None
+_SYNC_LOOP_LOCK = threading.Lock()
+
+def _sync_loop():
+    """One long-lived background loop shared by all sync callers.
+
+    asyncio.run would hand every call a fresh loop, but the compiled app and
+    its checkpointer bind to the loop that first runs them (see _get_app), so
+    a second call on a new loop fails. A single persistent loop keeps them
+    valid across calls, and run_coroutine_threadsafe also works from inside
+    Jupyter, where the caller's own loop is already running and asyncio.run
+    would raise.
+    """
+    global _SYNC_LOOP
+    with _SYNC_LOOP_LOCK:
+        if _SYNC_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="research-sync-loop", daemon=True
+            ).start()
+            _SYNC_LOOP = loop
+    return _SYNC_LOOP
+
+def conduct_research_sync(query):
+    """Synchronous convenience wrapper for scripts and notebooks.
+
+    Drains the streaming generator and returns the completed report. Gradio
+    uses the async generator directly; this exists for callers without a
+    usable event loop, and blocks the calling thread until done.
+    """
+    async def _collect():
+        text = ""
+        async for text, _thread_id in conduct_research(query):
+            pass
+        return text
+
+    return asyncio.run_coroutine_threadsafe(_collect(), _sync_loop()).result()
+
+async def conduct_research_batch(queries_text):
+    """Research several questions concurrently, one per line of input."""
+    queries = [q.strip() for q in queries_text.splitlines() if q.strip()]
+    if not queries:
+        return "Please enter at least one research question (one per line)."
+
+    try:
+        inputs = [{"messages": [HumanMessage(content=q)]} for q in queries]
+        configs = [
+            {
+                "configurable": {"thread_id": _thread_id_for(q)},
+                "max_concurrency": 8,
+                "recursion_limit": RECURSION_LIMIT,
+            }
+            for q in queries
+        ]
+
+        print(f"\n🔍 Researching {len(queries)} questions in a batch...\n")
+        print("=" * 50)
+
+        # abatch reuses the compiled graph and pooled HTTP connections, so N
+        # questions cost roughly max(per-query latency), not the sum
+        app = await _get_app()
+        results = await app.abatch(inputs, config=configs)
+
+        sections = []
+        for query, result in zip(queries, results):
+            sections.append(f"### {query}\n\n{_extract_report(result)}")
+        return "\n\n".join(sections)
+
+    except Exception as e:
+        error_msg = f"Error during batch research: {str(e)}"
+        print(f"❌ {error_msg}")
         return error_msg
 
 # ============================================================================
@@ -751,40 +1330,64 @@ def create_interface():
             """
         )
         
-        with gr.Row():
-            with gr.Column(scale=2):
-                query_input = gr.Textbox(
-                    label="Research Question",
-                    placeholder="e.g., What are the latest developments in quantum computing?",
-                    lines=3
-                )
-                
-                submit_btn = gr.Button(
-                    "🔍 Start Research",
-                    variant="primary",
-                    size="lg"
-                )
-                
-                gr.Markdown("### Example Questions:")
-                examples = [
-                    "What are the latest AI regulation developments globally?",
-                    "How is climate change affecting global food security?",
-                    "What are the economic impacts of remote work?",
-                ]
-                
-                for example in examples:
-                    gr.Button(example, size="sm").click(
-                        lambda x=example: x,
-                        outputs=query_input
+        with gr.Tab("Single Question"):
+            with gr.Row():
+                with gr.Column(scale=2):
+                    query_input = gr.Textbox(
+                        label="Research Question",
+                        placeholder="e.g., What are the latest developments in quantum computing?",
+                        lines=3
+                    )
+
+                    submit_btn = gr.Button(
+                        "🔍 Start Research",
+                        variant="primary",
+                        size="lg"
+                    )
+
+                    # gr.Examples fills the input client-side — no per-button
+                    # closures, event routes, or server round-trips on click
+                    gr.Examples(
+                        examples=[
+                            "What are the latest AI regulation developments globally?",
+                            "How is climate change affecting global food security?",
+                            "What are the economic impacts of remote work?",
+                        ],
+                        inputs=[query_input],
+                        label="Example Questions",
+                        cache_examples=False,
+                    )
+
+                with gr.Column(scale=3):
+                    output = gr.Textbox(
+                        label="Research Results",
+                        lines=25,
+                        max_lines=40,
+                        show_copy_button=True
+                    )
+
+        with gr.Tab("Batch Research"):
+            with gr.Row():
+                with gr.Column(scale=2):
+                    batch_input = gr.Textbox(
+                        label="Research Questions (one per line)",
+                        placeholder="Enter several questions, one per line...",
+                        lines=6
+                    )
+
+                    batch_btn = gr.Button(
+                        "🔍 Research All",
+                        variant="primary",
+                        size="lg"
+                    )
+
+                with gr.Column(scale=3):
+                    batch_output = gr.Textbox(
+                        label="Batch Results",
+                        lines=25,
+                        max_lines=40,
+                        show_copy_button=True
                     )
-            
-            with gr.Column(scale=3):
-                output = gr.Textbox(
-                    label="Research Results",
-                    lines=25,
-                    max_lines=40,
-                    show_copy_button=True
-                )
         
         gr.Markdown(
             """
@@ -794,18 +1397,28 @@ def create_interface():
         )
         
         # Connect the button
+        # Session-scoped research thread so follow-up questions resume the
+        # same checkpointed state
+        thread_state = gr.State(None)
+
         submit_btn.click(
             fn=conduct_research,
-            inputs=[query_input],
-            outputs=[output]
+            inputs=[query_input, thread_state],
+            outputs=[output, thread_state]
         )
-        
+
         query_input.submit(
             fn=conduct_research,
-            inputs=[query_input],
-            outputs=[output]
+            inputs=[query_input, thread_state],
+            outputs=[output, thread_state]
         )
-    
+
+        batch_btn.click(
+            fn=conduct_research_batch,
+            inputs=[batch_input],
+            outputs=[batch_output]
+        )
+
     return demo
 
 # ============================================================================
@@ -837,12 +1450,19 @@ def main():
     print("\n🌐 Launching web interface...")
     print("=" * 50)
     
+    # Queue requests so concurrent users multiplex on the asyncio loop
+    # instead of serializing on a single worker. Eight concurrent pipelines
+    # saturate the Anthropic rate limits; beyond that, extra runs just queue
+    # inside the API client, so cap admission here and bound the backlog.
+    demo.queue(default_concurrency_limit=8, max_size=32)
+
     # Launch with appropriate settings
     demo.launch(
         server_name="0.0.0.0",  # Allow external connections
         server_port=7860,        # Default Gradio port
         share=False,             # Set to True to create public link
-        debug=False              # Set to True for debugging
+        debug=False,             # Set to True for debugging
+        max_threads=64           # Headroom for threaded tool calls
     )
 
 if __name__ == "__main__":